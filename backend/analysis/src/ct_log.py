@@ -1,15 +1,31 @@
 import psycopg
 import dns.asyncresolver
+import dns.resolver
 import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# crt.sh is slow and rate-limited, and batched re-analyses hit the same target
+# domains repeatedly — cache the full fetch+resolve result for an hour.
+_SUBDOMAIN_CACHE = {}
+_SUBDOMAIN_TTL = 3600
+
 CRT_SH_HOST = "crt.sh"
 CRT_SH_PORT = 5432
 CRT_SH_USER = "guest"
 CRT_SH_DB = "certwatch"
 
+# Shared resolver: constructed once, answers cached so overlapping investigations
+# on the same domains skip repeat round-trips to the public resolvers.
+_RESOLVER = dns.asyncresolver.Resolver()
+_RESOLVER.timeout = 2.0
+_RESOLVER.lifetime = 2.0
+# Use public DNS for reliability check from container
+_RESOLVER.nameservers = ['8.8.8.8', '1.1.1.1']
+_RESOLVER.cache = dns.resolver.LRUCache(max_size=10000)
+
 def fetch_subdomains_from_crtsh(domain):
     """
     Connects to crt.sh public Postgres DB and fetches all subdomains.
@@ -18,62 +34,43 @@ def fetch_subdomains_from_crtsh(domain):
     subdomains = set()
     try:
         # Connect using psycopg 3 (sync)
+        # No autocommit: the named cursor below needs a real transaction
+        # block. WITH HOLD would also satisfy Postgres, but it materializes
+        # the whole result set at DECLARE, losing the row streaming.
         conn = psycopg.connect(
             host=CRT_SH_HOST,
             port=CRT_SH_PORT,
             user=CRT_SH_USER,
             dbname=CRT_SH_DB,
-            connect_timeout=10,
-            autocommit=True
+            connect_timeout=10
         )
-        cur = conn.cursor()
-        
-        # Optimized query for crt.sh (New Schema)
-        # Using web_search function which is the recommended way now
-        query = """
-            SELECT DISTINCT ci.NAME_VALUE
-            FROM certificate_identity ci
-            WHERE plainto_tsquery('certwatch', %s) @@ identities(ci.CERTIFICATE_ID)
-                AND ci.NAME_VALUE ILIKE %s
-            LIMIT 100
-        """
-        # The query expects domain for FTS and wildcard for filtering
-        search_pattern = f"%.{domain}"
-        
-        # Actually, crt.sh recommends:
-        # SELECT name_value FROM certificate_and_identities WHERE plainto_tsquery('certwatch', 'example.com') @@ identities(certificate_id)
-        # But that table might be a view.
-        # Let's try the standard pattern often used for crt.sh recently:
-        
+        # Query that works against crt.sh's current schema: the old
+        # certificate_identity table was superseded by the FTS index on certificate.
+        # The suffix filter uses the reverse(lower(name)) btree index crt.sh
+        # maintains — a leading-wildcard ILIKE would force a scan of every
+        # FTS-matched row instead.
         query = """
-            SELECT DISTINCT value
+            SELECT DISTINCT lower(name_value)
             FROM certificate_and_identities
             WHERE plainto_tsquery('certwatch', %s) @@ identities(certificate)
-            AND value ILIKE %s
+            AND reverse(lower(name_value)) LIKE reverse(lower(%s)) || '%%'
         """
-        
-        # Wait, the error said "certificate_identity table has been superseded by a Full Text Search index on the certificate table".
-        # simpler query that works on crt.sh:
-        query = """
-            SELECT DISTINCT param_value 
-            FROM (
-                SELECT lower(name_value) as param_value 
-                FROM certificate_and_identities 
-                WHERE plainto_tsquery('certwatch', %s) @@ identities(certificate)
-                AND name_value ILIKE %s
-            ) t
-        """
-        
-        cur.execute(query, (domain, search_pattern))
-        rows = cur.fetchall()
-        
-        for row in rows:
-            name = row[0]
-            # Clean up wildcards
-            if '*' in name:
-                continue
-            subdomains.add(name)
-            
+        search_pattern = f".{domain}"
+
+        # Named + binary cursor: rows stream in chunks instead of one huge
+        # fetchall, and the binary protocol skips text parsing overhead.
+        with conn.transaction():
+            with conn.cursor(name="crt_cur", binary=True) as cur:
+                cur.itersize = 2000
+                cur.execute(query, (domain, search_pattern))
+
+                for row in cur:
+                    name = row[0]
+                    # Clean up wildcards
+                    if '*' in name:
+                        continue
+                    subdomains.add(name)
+
         conn.close()
         logger.info(f"crt.sh found {len(subdomains)} potential subdomains for {domain}")
         return list(subdomains)
@@ -82,6 +79,49 @@ def fetch_subdomains_from_crtsh(domain):
         logger.error(f"Failed to query crt.sh: {e}")
         return []
 
+async def fetch_subdomains_from_crtsh_async(domain, queue=None):
+    """
+    Async variant of the crt.sh fetch. If a queue is given, names are pushed
+    as they stream off the cursor so DNS resolution can start while the
+    (often slow) crt.sh query is still running.
+    """
+    subdomains = set()
+    try:
+        aconn = await psycopg.AsyncConnection.connect(
+            host=CRT_SH_HOST,
+            port=CRT_SH_PORT,
+            user=CRT_SH_USER,
+            dbname=CRT_SH_DB,
+            connect_timeout=10
+        )
+        async with aconn:
+            query = """
+                SELECT DISTINCT lower(name_value)
+                FROM certificate_and_identities
+                WHERE plainto_tsquery('certwatch', %s) @@ identities(certificate)
+                AND reverse(lower(name_value)) LIKE reverse(lower(%s)) || '%%'
+            """
+            # Real transaction block so the named cursor streams rows as
+            # crt.sh produces them — a WITH HOLD cursor would materialize
+            # the full result set at DECLARE and stall the DNS queue until
+            # the whole query finished.
+            async with aconn.transaction():
+                async with aconn.cursor(name="crt_cur", binary=True) as cur:
+                    cur.itersize = 2000
+                    await cur.execute(query, (domain, f".{domain}"))
+                    async for row in cur:
+                        name = row[0]
+                        if '*' in name or name in subdomains:
+                            continue
+                        subdomains.add(name)
+                        if queue is not None:
+                            queue.put_nowait(name)
+
+        logger.info(f"crt.sh found {len(subdomains)} potential subdomains for {domain}")
+    except Exception as e:
+        logger.error(f"Failed to query crt.sh: {e}")
+    return list(subdomains)
+
 async def check_domain_active(domain, resolver):
     """
     Async check if A record exists for domain.
@@ -94,53 +134,80 @@ async def check_domain_active(domain, resolver):
     except:
         return None
 
-async def filter_active_subdomains(subdomains, concurrency=50):
+async def filter_active_subdomains(subdomains, concurrency=500):
     """
     Resolves a list of subdomains concurrently to find active ones.
+    Uses a queue + N worker tasks instead of one coroutine per candidate,
+    so crt.sh result sets with thousands of names don't spawn thousands
+    of tasks upfront. DNS is pure I/O, so concurrency can be high.
     """
-    resolver = dns.asyncresolver.Resolver()
-    resolver.timeout = 2.0
-    resolver.lifetime = 2.0
-    # Use public DNS for reliability check from container
-    resolver.nameservers = ['8.8.8.8', '1.1.1.1']
+    resolver = _RESOLVER
+
+    queue = asyncio.Queue()
+    for dom in subdomains:
+        queue.put_nowait(dom)
 
     active_subdomains = []
-    
-    # Process in chunks to avoid overwhelming local resources
-    semaphore = asyncio.Semaphore(concurrency)
-
-    async def sem_check(dom):
-        async with semaphore:
-            return await check_domain_active(dom, resolver)
-
-    tasks = [sem_check(dom) for dom in subdomains]
-    results = await asyncio.gather(*tasks)
-    
-    for res in results:
-        if res:
-            active_subdomains.append(res)
-            
+
+    async def worker():
+        while True:
+            try:
+                dom = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            res = await check_domain_active(dom, resolver)
+            if res:
+                active_subdomains.append(res)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(subdomains) or 1))]
+    await asyncio.gather(*workers)
+
     return active_subdomains
 
+async def get_active_subdomains_async(domain, concurrency=500):
+    """
+    Pipelined fetch + resolve: DNS workers consume names from a queue while
+    the crt.sh cursor is still streaming, instead of waiting for the full
+    candidate list before the first lookup.
+    """
+    cached = _SUBDOMAIN_CACHE.get(domain)
+    if cached and time.time() - cached[0] < _SUBDOMAIN_TTL:
+        return list(cached[1])
+
+    queue = asyncio.Queue()
+    active = []
+
+    async def dns_worker():
+        while True:
+            dom = await queue.get()
+            if dom is None:
+                return
+            res = await check_domain_active(dom, _RESOLVER)
+            if res:
+                active.append(res)
+
+    workers = [asyncio.create_task(dns_worker()) for _ in range(concurrency)]
+    candidates = await fetch_subdomains_from_crtsh_async(domain, queue)
+    for _ in workers:
+        queue.put_nowait(None)
+    await asyncio.gather(*workers)
+
+    logger.info(f"Active subdomains for {domain}: {len(active)} / {len(candidates)}")
+    # Only cache when crt.sh actually answered — an empty result from a failed
+    # query shouldn't suppress retries for the next hour.
+    if candidates:
+        _SUBDOMAIN_CACHE[domain] = (time.time(), list(active))
+    return active
+
 def get_active_subdomains(domain):
     """
     Main entry point: Fetch from CT logs -> Filter Active.
     """
-    # 1. Fetch Candidates
-    candidates = fetch_subdomains_from_crtsh(domain)
-    
-    if not candidates:
-        return []
-
-    # 2. Async Resolve
     # Need to run asyncio loop here
     try:
         loop = asyncio.get_event_loop()
     except RuntimeError:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        
-    active = loop.run_until_complete(filter_active_subdomains(candidates))
-    
-    logger.info(f"Active subdomains for {domain}: {len(active)} / {len(candidates)}")
-    return active
+
+    return loop.run_until_complete(get_active_subdomains_async(domain))
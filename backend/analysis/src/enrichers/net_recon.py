@@ -1,15 +1,40 @@
 import whois
+import asyncio
 import dns.resolver
+import dns.asyncresolver
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 from .base import BaseEnricher
 
 logger = logging.getLogger(__name__)
 
+_DNS_RECORD_TYPES = ('A', 'MX', 'TXT', 'NS')
+
+# WHOIS answers barely change and TLD servers rate-limit aggressively,
+# so cache results for a day. Keyed on the queried value.
+_WHOIS_CACHE: Dict[str, tuple] = {}
+_WHOIS_TTL = 24 * 3600
+_WHOIS_CACHE_MAX = 4096
+
+def _whois_cache_put(key: str, value: Dict[str, Any]) -> None:
+    now = time.time()
+    if len(_WHOIS_CACHE) >= _WHOIS_CACHE_MAX:
+        # Sweep expired entries first; if everything is still live, evict
+        # the oldest insertions so a long-running worker stays bounded.
+        for k in [k for k, (ts, _) in _WHOIS_CACHE.items() if now - ts >= _WHOIS_TTL]:
+            del _WHOIS_CACHE[k]
+        while len(_WHOIS_CACHE) >= _WHOIS_CACHE_MAX:
+            del _WHOIS_CACHE[next(iter(_WHOIS_CACHE))]
+    _WHOIS_CACHE[key] = (now, value)
+
 class WhoisEnricher(BaseEnricher):
     def __init__(self):
         super().__init__("WhoisEnricher")
+        # OPSEC: Tor proxy resolved once at construction, not per lookup
+        self._proxy_url = os.getenv("TOR_PROXY_URL")
 
     def can_handle(self, entity_type: str) -> bool:
         return entity_type in ['domain', 'ip']
@@ -18,12 +43,15 @@ class WhoisEnricher(BaseEnricher):
         if not self.can_handle(entity_type):
             return None
             
+        cached = _WHOIS_CACHE.get(entity_value)
+        if cached and time.time() - cached[0] < _WHOIS_TTL:
+            return cached[1]
+
         try:
             logger.info(f"Running WHOIS for {entity_value} ({entity_type})")
-            
-            # OPSEC: Check for Tor Proxy
-            proxy_url = os.getenv("TOR_PROXY_URL") 
-            
+
+            proxy_url = self._proxy_url
+
             w = None
             if entity_type == 'domain':
                 w = whois.whois(entity_value)
@@ -52,36 +80,80 @@ class WhoisEnricher(BaseEnricher):
                 "org": getattr(w, 'org', None) or getattr(w, 'name', None),
                 "country": getattr(w, 'country', None)
             }
-            return {"whois": result}
+            enriched = {"whois": result}
+            _whois_cache_put(entity_value, enriched)
+            return enriched
         except Exception as e:
             logger.error(f"WHOIS lookup failed for {entity_value}: {e}")
             return None
 
 class DNSEnricher(BaseEnricher):
+    # Shared across instances: one resolver with an answer cache, plus a small
+    # thread pool so the four record types resolve in one RTT instead of four.
+    _resolver = dns.resolver.Resolver()
+    _resolver.nameservers = ['8.8.8.8', '1.1.1.1']  # Google/Cloudflare to avoid local blocking
+    _resolver.cache = dns.resolver.LRUCache(max_size=10000)
+    _executor = ThreadPoolExecutor(max_workers=len(_DNS_RECORD_TYPES))
+
+    # Async twin sharing the same answer cache, for callers already on the event loop
+    _aresolver = dns.asyncresolver.Resolver()
+    _aresolver.nameservers = ['8.8.8.8', '1.1.1.1']
+    _aresolver.cache = _resolver.cache
+
     def __init__(self):
         super().__init__("DNSEnricher")
-        self.resolver = dns.resolver.Resolver()
-        # Use Google and Cloudflare DNS to avoid local blocking
-        self.resolver.nameservers = ['8.8.8.8', '1.1.1.1']
+        self.resolver = DNSEnricher._resolver
 
     def can_handle(self, entity_type: str) -> bool:
         return entity_type in ['domain', 'subdomain']
 
+    def _resolve_one(self, entity_value: str, rtype: str):
+        try:
+            answers = self.resolver.resolve(entity_value, rtype)
+            return rtype, [r.to_text() for r in answers]
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.resolver.NoNameservers, dns.resolver.Timeout):
+            return rtype, None
+        except Exception as e:
+            logger.error(f"DNS lookup {rtype} failed for {entity_value}: {e}")
+            return rtype, None
+
     def enrich(self, entity_type: str, entity_value: str) -> Optional[Dict[str, Any]]:
         if not self.can_handle(entity_type):
             return None
-            
+
         records = {}
-        for rtype in ['A', 'MX', 'TXT', 'NS']:
-            try:
-                answers = self.resolver.resolve(entity_value, rtype)
-                records[rtype] = [r.to_text() for r in answers]
-            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.resolver.NoNameservers, dns.resolver.Timeout):
+        futures = [self._executor.submit(self._resolve_one, entity_value, rtype)
+                   for rtype in _DNS_RECORD_TYPES]
+        for fut in futures:
+            rtype, values = fut.result()
+            if values:
+                records[rtype] = values
+
+        if not records:
+            return None
+
+        return {"dns_records": records}
+
+    async def enrich_async(self, entity_type: str, entity_value: str) -> Optional[Dict[str, Any]]:
+        """
+        Async variant: fires all record lookups concurrently on the event loop
+        (one worst-case RTT total) without occupying executor threads.
+        """
+        if not self.can_handle(entity_type):
+            return None
+
+        answers = await asyncio.gather(
+            *(self._aresolver.resolve(entity_value, rtype) for rtype in _DNS_RECORD_TYPES),
+            return_exceptions=True
+        )
+
+        records = {}
+        for rtype, ans in zip(_DNS_RECORD_TYPES, answers):
+            if isinstance(ans, Exception):
                 continue
-            except Exception as e:
-                logger.error(f"DNS lookup {rtype} failed for {entity_value}: {e}")
-        
+            records[rtype] = [r.to_text() for r in ans]
+
         if not records:
             return None
-            
+
         return {"dns_records": records}
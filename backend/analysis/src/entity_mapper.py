@@ -1,8 +1,34 @@
-import re
+import ipaddress
+
+# Public-suffix-aware root-domain extraction. The extractor is cached at module
+# scope (PSL load is expensive) and suffix_list_urls=None keeps it offline.
+try:
+    import tldextract
+    _extract = tldextract.TLDExtract(suffix_list_urls=None, cache_dir='/tmp/tld')
+except ImportError:
+    _extract = None
 
 class EntityMapper:
     def __init__(self):
-        pass
+        # Dispatch tables built once: the hot path becomes two dict lookups
+        # instead of a branch cascade executed per entity.
+        self._rules = {
+            'git': {
+                'user': 'github_user',
+                'repo': 'github_repo',
+                'email': 'email',
+                'organization': 'organization',
+            },
+        }
+        self._sns_prefix = {
+            '@': 'mastodon_account',  # defaulting strictly for now
+            '#': 'hashtag',
+        }
+        self._allowed_types = frozenset([
+            'person', 'organization', 'location', 'email', 'phone',
+            'url', 'company_product', 'position_title', 'rss_article',
+            'subdomain', 'ip'
+        ])
 
     def map_entity(self, raw_entity: dict, source_type: str = 'manual') -> dict:
         """
@@ -26,47 +52,30 @@ class EntityMapper:
         
         # 2. Type Refinement Rules
         final_type = 'misc'
-        
+
         # GitHub Handling
         if source_type == 'git':
-            if inferred_type == 'user':
-                final_type = 'github_user'
-            elif inferred_type == 'repo':
-                final_type = 'github_repo'
-            elif inferred_type == 'email':
-                final_type = 'email'
-            elif inferred_type == 'organization':
-                final_type = 'organization'
-                
+            final_type = self._rules['git'].get(inferred_type, 'misc')
+
         # SNS Handling
         elif source_type == 'sns':
-            if value.startswith('@'):
-                final_type = 'mastodon_account' # defaulting strictly for now
-            elif value.startswith('#'):
-                final_type = 'hashtag'
-            elif 'http' in value:
-                final_type = 'url'
-                
+            final_type = self._sns_prefix.get(value[:1]) \
+                or ('url' if 'http' in value else 'misc')
+
         # Infrastructure
         elif source_type == 'infra':
-            if '.' in value and not value.replace('.', '').isdigit():
-                final_type = 'subdomain'
-            elif re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", value):
+            # ipaddress is C-implemented and fails fast on hostnames,
+            # replacing two Python-level string scans per entity.
+            try:
+                ipaddress.ip_address(value)
                 final_type = 'ip'
-                
-        # Fallback / Direct Mapping
-        if final_type == 'misc':
-             # Map allow-listed types directly
-             allowed_types = [
-                 'person', 'organization', 'location', 'email', 'phone', 
-                 'url', 'company_product', 'position_title', 'rss_article'
-             ]
-             if inferred_type in allowed_types:
-                 final_type = inferred_type
-             elif inferred_type == 'subdomain':
-                 final_type = 'subdomain'
-             elif inferred_type == 'ip':
-                 final_type = 'ip'
+            except ValueError:
+                if '.' in value:
+                    final_type = 'subdomain'
+
+        # Fallback / Direct Mapping for allow-listed types
+        if final_type == 'misc' and inferred_type in self._allowed_types:
+            final_type = inferred_type
 
         # --- Phase 25: Static Relationship Linking ---
         relations = []
@@ -82,11 +91,18 @@ class EntityMapper:
              
         # 2. Subdomain -> Domain
         if final_type == 'subdomain':
-             parts = value.split('.')
-             if len(parts) > 2:
-                 # heuristic: take last 2 parts as domain (naive but works for .com, .org)
-                 # better to use tldextract but we keep it zero-dependency simple for now
-                 root_domain = ".".join(parts[-2:])
+             root_domain = None
+             if _extract:
+                 # PSL-aware: handles multi-label TLDs like co.uk / com.br correctly
+                 ex = _extract(value)
+                 if ex.subdomain and ex.suffix:
+                     root_domain = f"{ex.domain}.{ex.suffix}"
+             else:
+                 # Fallback heuristic: last 2 labels (works for .com, .org)
+                 parts = value.split('.')
+                 if len(parts) > 2:
+                     root_domain = ".".join(parts[-2:])
+             if root_domain:
                  relations.append({
                      "label": "subdomain_of",
                      "target": root_domain,
@@ -6,8 +6,8 @@ import logging
 import sys
 from psycopg_pool import AsyncConnectionPool
 from extractor import extract_and_save
-from indexer import index_content
-from nlp_analyzer import analyze_and_save
+from indexer import index_content, start_index_flusher
+from nlp_analyzer import analyze_and_save, get_nlp_model
 from scorer import run_scoring
 from enrichers import WhoisEnricher, DNSEnricher
 from alerts import AlertManager
@@ -26,9 +26,15 @@ ttp_mapper = TTPMapper()
 # Load basic watchlist for demo - ideally this comes from DB/Config
 alert_manager.load_watchlist(['bad.com', 'evil-corp.org', 'test@example.com']) 
 
-from bs4 import BeautifulSoup
+# selectolax (C parser) when available; bs4 as the pure-Python fallback
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+    from bs4 import BeautifulSoup
 from minio import Minio
 import psycopg
+from psycopg.types.json import Jsonb
 
 # Configuration
 REDIS_URL = os.environ["REDIS_URL"]
@@ -37,6 +43,10 @@ MINIO_ENDPOINT = os.environ["MINIO_ENDPOINT"]
 MINIO_ACCESS_KEY = os.getenv("MINIO_ROOT_USER") or "admin"
 MINIO_SECRET_KEY = os.getenv("MINIO_ROOT_PASSWORD") or "password"
 BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "investigations")
+# Investigations are independent; this bounds how many run at once so one
+# slow job doesn't stall the queue while N concurrent jobs can't exhaust
+# the shared pool/clients either.
+MAX_CONCURRENT_JOBS = int(os.getenv("WORKER_CONCURRENCY", "8"))
 
 # Initialize MinIO
 minio_client = Minio(
@@ -65,7 +75,16 @@ async def process_enrichment_and_alerts(investigation_id, r_conn, db_pool):
                     (investigation_id,)
                 )
                 rows = await cur.fetchall()
-                
+
+                # Metadata updates are collected and flushed in one pipelined
+                # burst after the loop instead of a round-trip per changed row.
+                updates = []
+
+                # One TTP scan over all values up front: if the joined corpus
+                # has no keyword hits (the common case), every per-row scan
+                # and tag-set rebuild below can be skipped outright.
+                corpus_hits = ttp_mapper.map_text('\n'.join(str(r[2]) for r in rows))
+
                 for row in rows:
                     ent_id, ent_type, ent_value, ent_metadata = row
                     if not ent_metadata: ent_metadata = {}
@@ -87,25 +106,26 @@ async def process_enrichment_and_alerts(investigation_id, r_conn, db_pool):
                         changed = True
                         logger.info(f"[+] Enriched {ent_value} ({ent_type})")
 
-                    # 3. TTP Mapping
-                    tags = ttp_mapper.map_text(str(ent_value))
+                    # 3. TTP Mapping (per-row scan only when the corpus hit)
+                    tags = ttp_mapper.map_text(str(ent_value)) if corpus_hits else []
                     # Also map from metadata if useful text exists (e.g. title)
+                    # — whois org is fresh from enrichment, not in the corpus
                     if 'whois' in ent_metadata and 'org' in ent_metadata['whois']:
                          tags.extend(ttp_mapper.map_text(str(ent_metadata['whois']['org'])))
-                    
-                    current_tags = ent_metadata.get('ttps', [])
-                    new_tags = list(set(current_tags + tags))
-                    if len(new_tags) > len(current_tags):
-                        ent_metadata['ttps'] = new_tags
-                        changed = True
-                        logger.info(f"[+] TTPs found for {ent_value}: {tags}")
 
-                    # 4. Update DB if changed
+                    new_tags = ent_metadata.get('ttps', [])
+                    if tags:
+                        current_tags = new_tags
+                        new_tags = list(set(current_tags + tags))
+                        if len(new_tags) > len(current_tags):
+                            ent_metadata['ttps'] = new_tags
+                            changed = True
+                            logger.info(f"[+] TTPs found for {ent_value}: {tags}")
+
+                    # 4. Queue DB update if changed (Jsonb serializes via the
+                    # orjson dumper registered in extractor)
                     if changed:
-                         await cur.execute(
-                             "UPDATE intelligence SET metadata = %s WHERE id = %s",
-                             (json.dumps(ent_metadata), ent_id)
-                         )
+                         updates.append((Jsonb(ent_metadata), ent_id))
 
                     # 5. Alerts
                     # Check watchlist and TTPs
@@ -123,6 +143,13 @@ async def process_enrichment_and_alerts(investigation_id, r_conn, db_pool):
                             metadata={'ttps': new_tags, 'msg': 'TTP Detected'}
                         )
 
+                if updates:
+                    async with aconn.pipeline():
+                        await cur.executemany(
+                            "UPDATE intelligence SET metadata = %s WHERE id = %s",
+                            updates
+                        )
+
             # Pool connection context manager handles transaction/commit/rollback if configured, 
             # but usually explicit commit is needed for psycopg 3 unless autocommit.
             # aconn is yielded from pool.connection() which is an AsyncConnection.
@@ -137,16 +164,83 @@ async def process_enrichment_and_alerts(investigation_id, r_conn, db_pool):
     except Exception as e:
         logger.error(f"[!] Enrichment/Alerting failed: {e}")
 
+async def process_message(data, r_conn, db_pool):
+    """Full analysis pipeline for one investigation-completed event."""
+    logger.info(f"[+] Received event for investigation: {data.get('id')}")
+
+    investigation_id = data.get('id')
+    target_url = data.get('targetUrl')
+
+    # 1. Run Entity Extraction (Emails, Phones - existing)
+    # It already queried artifacts and downloaded the html
+    # object, so reuse both instead of repeating the SELECT
+    # and the MinIO round-trip.
+    html_path, html_content = await extract_and_save(investigation_id, target_url=target_url, db_pool=db_pool)
+
+    # --- Reliability Fix: Content Size Limit ---
+    # Analyze at most 5MB to prevent OOM
+    if html_content and len(html_content) > 5 * 1024 * 1024:
+        logger.warning(f"Artifact {html_path} exceeds 5MB limit. Truncating for analysis.")
+        html_content = html_content[:5 * 1024 * 1024]
+
+    # 3. Analyze Text (NLP - Named Entity Recognition & Sentiment)
+    async def run_nlp():
+        try:
+            # Extract text from HTML (both parsers accept bytes)
+            if HTMLParser:
+                text = HTMLParser(html_content).text(separator=' ')
+            else:
+                text = BeautifulSoup(html_content, 'html.parser').get_text()
+
+            # Analyze - Pass pool
+            await analyze_and_save(investigation_id, text, db_pool)
+
+        except Exception as e:
+            logger.error(f"NLP Analysis failed: {e}")
+
+    # 3.5 Indexing (Meilisearch) - Optimized
+    async def run_indexing():
+        try:
+             await index_content(investigation_id, target_url, html_content)
+        except Exception as e:
+             # Indexing failure shouldn't fail the pipeline
+             logger.warning(f"Indexing failed: {e}")
+
+    # NLP, indexing and enrichment are mutually independent once
+    # extraction has landed, so fan them out; each task catches
+    # its own failures. Scoring waits — it reads what they write.
+    async with asyncio.TaskGroup() as tg:
+        if html_path and html_content:
+            tg.create_task(run_nlp())
+            tg.create_task(run_indexing())
+        # 3.6 Enrichment & Alerts (Phase 31)
+        tg.create_task(process_enrichment_and_alerts(investigation_id, r_conn, db_pool))
+
+    # 4. Scoring
+    await run_scoring(investigation_id, db_pool=db_pool)
+
+    logger.info(f"[-] Analysis completed for {investigation_id}")
+
 async def worker():
     # Run DB Migration on Startup
     await migrate()
 
+    # Warm the spaCy model before taking jobs so the first investigation
+    # doesn't pay the multi-second load, and every concurrent task shares
+    # the one in-process copy.
+    await asyncio.get_running_loop().run_in_executor(None, get_nlp_model)
+
     logger.info(f"[*] Analysis Worker started. Connecting to {REDIS_URL}...")
     
     # Initialize DB Pool
-    db_pool = AsyncConnectionPool(DB_DSN, open=False)
+    # prepare_threshold=0: worker SQL is a fixed set of statements, so let the
+    # server plan each once per connection from the first execution.
+    db_pool = AsyncConnectionPool(DB_DSN, open=False, kwargs={"prepare_threshold": 0})
     await db_pool.open()
     logger.info("DB Pool initialized")
+
+    # Background Meilisearch batcher (docs flush in groups, not per event)
+    index_flusher = start_index_flusher()
     
     try:
         r = redis.from_url(REDIS_URL)
@@ -158,79 +252,31 @@ async def worker():
         await db_pool.close()
         return
 
+    sem = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+    tasks = set()
+
+    async def handle(data):
+        async with sem:
+            try:
+                await process_message(data, r, db_pool)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+
     try:
         async for message in pubsub.listen():
             if message['type'] == 'message':
                 try:
                     data = json.loads(message['data'])
-                    logger.info(f"[+] Received event for investigation: {data.get('id')}")
-                    
-                    investigation_id = data.get('id')
-                    target_url = data.get('targetUrl')
-
-                    # 1. Run Entity Extraction (Emails, Phones - existing)
-                    # NOTE: extract_and_save might still use its own connection logic. 
-                    # Ideally we pass pool, but for now we focus on main flow and nlp.
-                    await extract_and_save(investigation_id, target_url=target_url, db_pool=db_pool)
-
-                    # 2. Fetch HTML content for Advanced Analysis
-                    html_path = None
-                    try:
-                        async with db_pool.connection() as aconn:
-                            async with aconn.cursor() as cur:
-                                 await cur.execute("SELECT storage_path FROM artifacts WHERE investigation_id = %s AND artifact_type = 'html'", (investigation_id,))
-                                 row = await cur.fetchone()
-                                 if row:
-                                     html_path = row[0]
-                    except Exception as e:
-                        logger.error(f"DB Error fetching HTML path: {e}")
-
-                    # 3. Analyze Text (NLP - Named Entity Recognition & Sentiment)
-                    if html_path:
-                        try:
-                            # Fetch content from MinIO
-                            # Use asyncio.to_thread for blocking MinIO call
-                            resp = await asyncio.to_thread(minio_client.get_object, BUCKET_NAME, html_path)
-                            
-                            # --- Reliability Fix: Content Size Limit ---
-                            # Read only up to 5MB to prevent OOM
-                            html_content_bytes = resp.read(5 * 1024 * 1024)
-                            if resp.read(1):
-                                 logger.warning(f"Artifact {html_path} exceeds 5MB limit. Truncating for analysis.")
-                            
-                            html_content = html_content_bytes.decode('utf-8', errors='ignore')
-                            resp.close()
-                            resp.release_conn()
-                            
-                            # Extract text from HTML
-                            soup = BeautifulSoup(html_content, 'html.parser')
-                            text = soup.get_text()
-                            
-                            # Analyze - Pass pool
-                            await analyze_and_save(investigation_id, text, db_pool)
-                            
-                        except Exception as e:
-                            logger.error(f"NLP Analysis failed: {e}")
-
-                        # 3.5 Indexing (Meilisearch) - Optimized
-                        try:
-                             # Now index_content is async and non-blocking
-                             await index_content(investigation_id, target_url, html_content)
-                        except Exception as e:
-                             # Indexing failure shouldn't fail the pipeline
-                             logger.warning(f"Indexing failed: {e}")
-                    
-                    # 3.6 Enrichment & Alerts (Phase 31)
-                    await process_enrichment_and_alerts(investigation_id, r, db_pool)
-
-                    # 4. Scoring
-                    await run_scoring(investigation_id)
-                    
-                    logger.info(f"[-] Analysis completed for {investigation_id}")
-
                 except Exception as e:
                     logger.error(f"Error processing message: {e}")
+                    continue
+                # Dispatch instead of awaiting inline: the listen loop keeps
+                # draining while up to MAX_CONCURRENT_JOBS investigations run.
+                task = asyncio.create_task(handle(data))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
     finally:
+        index_flusher.cancel()
         await db_pool.close()
         logger.info("DB Pool closed")
 
@@ -8,36 +8,30 @@ logger = logging.getLogger("migration")
 logging.basicConfig(level=logging.INFO)
 
 async def check_and_create_enum(cur, enum_name, values):
-    await cur.execute(f"SELECT 1 FROM pg_type WHERE typname = '{enum_name}'")
-    if not await cur.fetchone():
-        logger.info(f"[*] Creating ENUM type '{enum_name}'...")
-        # Postgres cannot parameterize type names or values easily in CREATE TYPE
-        values_str = ", ".join([f"'{v}'" for v in values])
-        await cur.execute(f"CREATE TYPE {enum_name} AS ENUM ({values_str});")
-        logger.info(f"[+] ENUM '{enum_name}' created.")
-    else:
-        logger.info(f"[-] ENUM '{enum_name}' already exists. (Skipping value check for now)")
+    # CREATE TYPE has no IF NOT EXISTS, so probe pg_type server-side in a DO
+    # block — one statement, no check round-trip beforehand.
+    logger.info(f"[*] Ensuring ENUM type '{enum_name}' exists...")
+    # Postgres cannot parameterize type names or values easily in CREATE TYPE
+    values_str = ", ".join([f"'{v}'" for v in values])
+    await cur.execute(f"""
+        DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{enum_name}') THEN
+                CREATE TYPE {enum_name} AS ENUM ({values_str});
+            END IF;
+        END $$;
+    """)
 
 async def add_column_if_not_exists(cur, table, column, definition):
-    await cur.execute("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name=%s AND column_name=%s;
-    """, (table, column))
-    if not await cur.fetchone():
-        logger.info(f"[*] Adding column '{column}' to '{table}'...")
-        # Columns and table names cannot be parameterized in the same way as values
-        # but we can at least ensure we are safe here or use Identifier if available.
-        from psycopg.sql import Identifier, SQL
-        query = SQL("ALTER TABLE {table} ADD COLUMN {column} {definition}").format(
-            table=Identifier(table),
-            column=Identifier(column),
-            definition=SQL(definition)
-        )
-        await cur.execute(query)
-        logger.info(f"[+] Column '{column}' added.")
-    else:
-        logger.info(f"[-] Column '{column}' already exists.")
+    logger.info(f"[*] Ensuring column '{column}' on '{table}'...")
+    # Columns and table names cannot be parameterized in the same way as values
+    # but we can at least ensure we are safe here or use Identifier if available.
+    from psycopg.sql import Identifier, SQL
+    query = SQL("ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}").format(
+        table=Identifier(table),
+        column=Identifier(column),
+        definition=SQL(definition)
+    )
+    await cur.execute(query)
 
 async def migrate():
     logger.info("Starting Database Migration for Phase 24...")
@@ -56,25 +50,30 @@ async def migrate():
                     'facility', 'product', 'event', 'entity',
                     'asn', 'crypto', 'cve'
                 ]
-                await check_and_create_enum(cur, 'entity_type_enum', entity_types)
-                
                 source_types = [
                     'rss', 'mastodon', 'twitter', 'github', 'infra', 'wayback', 'manual'
                 ]
-                await check_and_create_enum(cur, 'source_type_enum', source_types)
 
-                # 2. Add Columns
-                # score (existing)
-                await add_column_if_not_exists(cur, 'intelligence', 'score', 'FLOAT DEFAULT 0')
-                
-                # confidence_score
-                await add_column_if_not_exists(cur, 'intelligence', 'confidence_score', 'FLOAT DEFAULT 1.0')
-                
-                # metadata
-                await add_column_if_not_exists(cur, 'intelligence', 'metadata', "JSONB DEFAULT '{}'::jsonb")
-                
-                # source_type
-                await add_column_if_not_exists(cur, 'intelligence', 'source_type', "source_type_enum DEFAULT 'manual'")
+                # All the statements below are independent idempotent DDL, so
+                # pipeline them: one network round instead of one per execute.
+                # Phases that need to read results back (the type check, the
+                # constraint try/except) stay outside the pipeline blocks.
+                async with aconn.pipeline():
+                    await check_and_create_enum(cur, 'entity_type_enum', entity_types)
+                    await check_and_create_enum(cur, 'source_type_enum', source_types)
+
+                    # 2. Add Columns
+                    # score (existing)
+                    await add_column_if_not_exists(cur, 'intelligence', 'score', 'FLOAT DEFAULT 0')
+
+                    # confidence_score
+                    await add_column_if_not_exists(cur, 'intelligence', 'confidence_score', 'FLOAT DEFAULT 1.0')
+
+                    # metadata
+                    await add_column_if_not_exists(cur, 'intelligence', 'metadata', "JSONB DEFAULT '{}'::jsonb")
+
+                    # source_type
+                    await add_column_if_not_exists(cur, 'intelligence', 'source_type', "source_type_enum DEFAULT 'manual'")
 
                 # 3. UNIQUE Constraint for intelligence
                 try:
@@ -101,14 +100,30 @@ async def migrate():
                 
                 if current_type and current_type not in ('USER-DEFINED', 'entity_type_enum'):
                     logger.info(f"[*] Converting column 'type' from {current_type} to entity_type_enum...")
-                    # Sanitize data first
+                    # Sanitize data first. Batched by ctid with a commit per
+                    # batch so the backfill never holds row locks across the
+                    # whole table; SKIP LOCKED lets it coexist with live
+                    # writers. (The DDL above is idempotent, so the interim
+                    # commits are safe.)
                     safe_types = ", ".join([f"'{t}'" for t in entity_types])
-                    await cur.execute(f"""
-                        UPDATE intelligence 
-                        SET type = 'misc' 
-                        WHERE type NOT IN ({safe_types});
-                    """)
-                    
+                    while True:
+                        await cur.execute(f"""
+                            UPDATE intelligence
+                            SET type = 'misc'
+                            WHERE ctid IN (
+                                SELECT ctid FROM intelligence
+                                WHERE type NOT IN ({safe_types})
+                                LIMIT 10000
+                                FOR UPDATE SKIP LOCKED
+                            );
+                        """)
+                        updated = cur.rowcount
+                        await aconn.commit()
+                        if updated < 10000:
+                            break
+                        logger.info(f"[*] Backfilled {updated} rows, continuing...")
+
+
                     # Alter type
                     await cur.execute("""
                         ALTER TABLE intelligence 
@@ -121,48 +136,48 @@ async def migrate():
                 # 35.1: hash_sha256 for artifacts
                 await add_column_if_not_exists(cur, 'artifacts', 'hash_sha256', 'VARCHAR(64)')
 
-                # 35.2: audit_logs table
-                await cur.execute("SELECT to_regclass('public.audit_logs');")
-                res = await cur.fetchone()
-                if not res or not res[0]:
-                    logger.info("[*] Creating table 'audit_logs'...")
-                    await cur.execute("""
-                        CREATE TABLE audit_logs (
-                            id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
-                            user_id UUID,
-                            action VARCHAR(50) NOT NULL,
-                            resource_type VARCHAR(50) NOT NULL,
-                            resource_id VARCHAR(255),
-                            timestamp TIMESTAMPTZ DEFAULT NOW(),
-                            details JSONB DEFAULT '{}'::jsonb
-                        );
-                    """)
-                    await cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_logs(user_id);")
-                    await cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_resource ON audit_logs(resource_id);")
-                    logger.info("[+] Table 'audit_logs' created.")
-                else:
-                    logger.info("[-] Table 'audit_logs' already exists.")
+                # 35.2: audit_logs table + its indexes, one multi-statement
+                # round-trip (simple protocol, so not inside a pipeline block)
+                logger.info("[*] Ensuring table 'audit_logs' exists...")
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS audit_logs (
+                        id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+                        user_id UUID,
+                        action VARCHAR(50) NOT NULL,
+                        resource_type VARCHAR(50) NOT NULL,
+                        resource_id VARCHAR(255),
+                        timestamp TIMESTAMPTZ DEFAULT NOW(),
+                        details JSONB DEFAULT '{}'::jsonb
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_logs(user_id);
+                    CREATE INDEX IF NOT EXISTS idx_audit_resource ON audit_logs(resource_id);
+                """)
 
                 # --- 🛡️ Row-Level Security (RLS) Implementation ---
+                # 3 statements per table used to mean 12 round-trips; the
+                # identifiers come from the hardcoded list below, so the whole
+                # batch is safe to join and send as one execute.
                 logger.info("[*] Enabling Row-Level Security (RLS)...")
                 tables_with_rls = ['investigations', 'artifacts', 'intelligence', 'audit_logs']
+                sql_parts = []
                 for table in tables_with_rls:
-                    await cur.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;")
-                    
+                    sql_parts.append(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;")
+
                     # Create policy: user can only see their own rows
                     # Note: We need to DROP first to make it idempotent
-                    await cur.execute(f"DROP POLICY IF EXISTS {table}_user_isolation ON {table};")
-                    
+                    sql_parts.append(f"DROP POLICY IF EXISTS {table}_user_isolation ON {table};")
+
                     if table == 'investigations' or table == 'audit_logs':
-                        await cur.execute(f"""
+                        sql_parts.append(f"""
                             CREATE POLICY {table}_user_isolation ON {table}
                             USING (user_id = (current_setting('app.current_user_id', true))::uuid);
                         """)
                     elif table == 'artifacts' or table == 'intelligence':
-                        await cur.execute(f"""
+                        sql_parts.append(f"""
                             CREATE POLICY {table}_user_isolation ON {table}
                             USING (investigation_id IN (SELECT id FROM investigations WHERE user_id = (current_setting('app.current_user_id', true))::uuid));
                         """)
+                await cur.execute("\n".join(sql_parts))
 
                 await aconn.commit()
                 logger.info("[+] Migration completed successfully.")
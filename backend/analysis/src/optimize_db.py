@@ -13,7 +13,16 @@ async def optimize_db():
                 await cur.execute("CREATE INDEX IF NOT EXISTS idx_intelligence_value ON intelligence(value);")
                 await cur.execute("CREATE INDEX IF NOT EXISTS idx_intelligence_type ON intelligence(type);")
                 await cur.execute("CREATE INDEX IF NOT EXISTS idx_intelligence_norm_value ON intelligence(normalized_value);")
-                
+
+                # Unique identity index matching the ON CONFLICT target the
+                # writers use, so upserts stay idempotent even on databases
+                # where the migration's constraint step didn't run. Keyed on
+                # value, not normalized_value — a second unique index on a
+                # different column set would make the existing
+                # ON CONFLICT (investigation_id, type, value) inserts raise
+                # instead of resolve.
+                await cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS uniq_intel_item ON intelligence(investigation_id, type, value);")
+
                 # 2. Artifacts Hashes
                 await cur.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_hash ON artifacts(hash_sha256);")
                 
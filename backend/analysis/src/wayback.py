@@ -1,58 +1,95 @@
 import requests
+import asyncio
 import time
 import logging
 from datetime import datetime
 
+# httpx gives us a true async client (shared connection pool, many snapshots
+# in flight on one loop); the sync requests path stays for script callers.
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
 CDX_API_URL = "http://web.archive.org/cdx/search/cdx"
 WAYBACK_BASE_URL = "http://web.archive.org/web"
 
-def fetch_snapshots(target_url, limit_per_year=1, max_years=5):
-    """
-    Fetch snapshots from CDX API.
-    Strategy: Sample 1 snapshot per year to minimize load and redundancy.
-    """
-    snapshots = []
-    
+_async_client = None
+
+def _get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=15,
+            limits=httpx.Limits(max_connections=32),
+            follow_redirects=True
+        )
+    return _async_client
+
+def _cdx_params(target_url):
     # Filter for 200 OK and HTML only to avoid junk
-    params = {
+    return {
         'url': target_url,
         'output': 'json',
         'fl': 'timestamp,original,mimetype,statuscode,digest',
         'filter': ['statuscode:200', 'mimetype:text/html'],
-        'collapse': 'digest' # Skip duplicate content
+        'collapse': 'digest'  # Skip duplicate content
     }
 
+def _select_snapshots(data, max_years):
+    """Pick one snapshot per year (newest first) from a CDX JSON response."""
+    # data[0] is header: ['timestamp', 'original', 'mimetype', 'statuscode', 'digest']
+    if not data or len(data) <= 1:
+        return []
+
+    rows = data[1:]
+    # Sort by timestamp desc
+    rows.sort(key=lambda x: x[0], reverse=True)
+
+    snapshots = []
+    seen_years = set()
+
+    for row in rows:
+        ts = row[0]  # YYYYMMDDHHMMSS
+        year = ts[:4]
+
+        if year not in seen_years:
+            snapshots.append({
+                'timestamp': ts,
+                'original': row[1],
+                'url': f"{WAYBACK_BASE_URL}/{ts}id_/{row[1]}"
+            })
+            seen_years.add(year)
+
+        if len(seen_years) >= max_years:
+            break
+
+    return snapshots
+
+def fetch_snapshots(target_url, limit_per_year=1, max_years=5):
+    """
+    Fetch snapshots from CDX API.
+    Strategy: Sample 1 snapshot per year to minimize load and redundancy.
+    """
     try:
-        response = requests.get(CDX_API_URL, params=params, timeout=10)
-        data = response.json()
-        
-        # data[0] is header: ['timestamp', 'original', 'mimetype', 'statuscode', 'digest']
-        if not data or len(data) <= 1:
-            return []
-
-        rows = data[1:]
-        # Sort by timestamp desc
-        rows.sort(key=lambda x: x[0], reverse=True)
-
-        seen_years = set()
-        
-        for row in rows:
-            ts = row[0] # YYYYMMDDHHMMSS
-            year = ts[:4]
-            
-            if year not in seen_years:
-                snapshots.append({
-                    'timestamp': ts,
-                    'original': row[1],
-                    'url': f"{WAYBACK_BASE_URL}/{ts}id_/{row[1]}"
-                })
-                seen_years.add(year)
-            
-            if len(seen_years) >= max_years:
-                break
-                
+        response = requests.get(CDX_API_URL, params=_cdx_params(target_url), timeout=10)
+        snapshots = _select_snapshots(response.json(), max_years)
+        logger.info(f"Wayback: Found {len(snapshots)} snapshots for {target_url}")
+        return snapshots
+
+    except Exception as e:
+        logger.error(f"Wayback CDX Error: {e}")
+        return []
+
+async def fetch_snapshots_async(target_url, limit_per_year=1, max_years=5):
+    """Async variant of fetch_snapshots; falls back to a thread when httpx is absent."""
+    if httpx is None:
+        return await asyncio.to_thread(fetch_snapshots, target_url, limit_per_year, max_years)
+    try:
+        response = await _get_async_client().get(CDX_API_URL, params=_cdx_params(target_url), timeout=10)
+        snapshots = _select_snapshots(response.json(), max_years)
         logger.info(f"Wayback: Found {len(snapshots)} snapshots for {target_url}")
         return snapshots
 
@@ -74,3 +111,18 @@ def get_historical_content(snapshot_url):
     except Exception as e:
         logger.error(f"Wayback Content Fetch Error: {e}")
         return None
+
+async def get_historical_content_async(snapshot_url):
+    """Async variant of get_historical_content; snapshots fetch concurrently
+    on one shared client instead of one thread + sleep each."""
+    if httpx is None:
+        return await asyncio.to_thread(get_historical_content, snapshot_url)
+    try:
+        await asyncio.sleep(1.5)  # Polite delay (concurrent requests each wait)
+        resp = await _get_async_client().get(snapshot_url)
+        if resp.status_code == 200:
+            return resp.text
+        return None
+    except Exception as e:
+        logger.error(f"Wayback Content Fetch Error: {e}")
+        return None